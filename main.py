@@ -21,11 +21,12 @@ def cli():
 @cli.command()
 @click.argument('input_file', type=click.Path(exists=True))
 @click.option('--output-dir', '-o', default='build', help='Output directory for compiled files')
-def compile(input_file, output_dir):
+@click.option('--arch', default=None, help='Target architecture, e.g. sm_86 (default: detect from GPU 0)')
+def compile(input_file, output_dir, arch):
     """Compile a CUDA/Triton kernel to PTX and CUBIN"""
     try:
         ensure_dir(output_dir)
-        compiler = Compiler()
+        compiler = Compiler(arch=arch)
         ptx_file, cubin_file = compiler.compile(input_file, output_dir)
         console.print(f"[green]Successfully compiled:[/green]")
         console.print(f"PTX: {ptx_file}")
@@ -66,11 +67,12 @@ def assemble(sass_file, output_dir):
 @click.argument('cubin_file', type=click.Path(exists=True))
 @click.option('--args', help='Kernel arguments as JSON string')
 @click.option('--compare-with', type=click.Path(exists=True), help='Original CUBIN to compare against')
-def run(cubin_file, args, compare_with):
+@click.option('--check/--no-check', default=True, help='Verify the output against a host reference')
+def run(cubin_file, args, compare_with, check):
     """Run and benchmark a CUBIN kernel"""
     try:
         runner = KernelRunner()
-        results = runner.run(cubin_file, args, compare_with)
+        results = runner.run(cubin_file, args, compare_with, check=check)
         console.print("[green]Kernel execution results:[/green]")
         console.print(results)
     except Exception as e:
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from pathlib import Path
 from typing import Union
 from .utils import run_command, ensure_dir
@@ -20,16 +22,23 @@ class Assembler:
         output_dir = ensure_dir(output_dir)
         cubin_file = output_dir / f"{cuasm_path.stem}_new.cubin"
         
-        if not cuasm_path.exists():
-            raise FileNotFoundError(f"Could not find {cuasm_path}. Please run disassemble first.")
+        try:
+            cuasm_path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Could not find {cuasm_path}. Please run disassemble first.") from None
             
-        # Use CuAssembler to convert CuASM back to CUBIN
-        run_command([
-            'cuasm',
-            '--asm2bin',
-            str(cuasm_path),
-            '-o', str(cubin_file)
-        ])
+        # Use CuAssembler to convert CuASM back to CUBIN. It writes into a scratch dir and
+        # the result is renamed into place, so hard links to an earlier build (the
+        # disassembler's .original.cubin) keep their contents
+        with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir:
+            tmp_cubin = Path(tmp_dir) / cubin_file.name
+            run_command([
+                'cuasm',
+                '--asm2bin',
+                str(cuasm_path),
+                '-o', str(tmp_cubin)
+            ])
+            os.replace(tmp_cubin, cubin_file)
         
         return cubin_file
 
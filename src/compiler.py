@@ -1,11 +1,35 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple, Union
+from typing import List, Optional, Tuple, Union
+import pycuda.driver as cuda
 import triton
 import torch
-from .utils import run_command, ensure_dir
+from .utils import run_command, ensure_dir, _which
+
+try:
+    from cuda.bindings import nvrtc
+except ImportError:
+    try:
+        from cuda import nvrtc  # cuda-python < 12.6
+    except ImportError:
+        nvrtc = None
+
+DEFAULT_ARCH = 'sm_86'  # Used when no GPU can be queried
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'sassplayground'
 
 class Compiler:
     """Handles compilation of CUDA/Triton kernels to PTX and CUBIN"""
+
+    def __init__(self, arch: Optional[str] = None, cache_dir: Optional[Union[str, Path]] = CACHE_DIR):
+        # Target the installed GPU unless an explicit sm_XX is given
+        self.arch = arch or _detect_arch()
+        # Compiled artifacts are cached by content; pass cache_dir=None to disable
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
     
     def compile(self, input_file: Union[str, Path], output_dir: Union[str, Path]) -> Tuple[Path, Path]:
         """
@@ -24,38 +48,167 @@ class Compiler:
         print(input_path)
         
         if input_path.suffix == '.cu':
-            return self._compile_cuda(input_path, output_dir)
+            if self.cache_dir is None:
+                return self._compile_cuda_uncached(input_path, output_dir)
+            return self._compile_cuda_cached(input_path, output_dir)
         elif input_path.suffix == '.py':
             return self._compile_triton(input_path, output_dir)
         else:
             raise ValueError(f"Unsupported file type: {input_path.suffix}")
 
+    def _compile_cuda_cached(self, cuda_file: Path, output_dir: Path) -> Tuple[Path, Path]:
+        """Serve PTX and CUBIN from the on-disk cache, compiling only on a miss"""
+        stem = cuda_file.stem
+        ptx_file = output_dir / f"{stem}.ptx"
+        cubin_file = output_dir / f"{stem}.cubin"
+
+        key = self._cache_key(cuda_file)
+        if key is None:
+            return self._compile_cuda_uncached(cuda_file, output_dir)
+        # The cache only ever speeds things up: if it can't be used (read-only or
+        # missing $HOME, full disk, ...) compile straight into output_dir instead
+        try:
+            cache_dir = ensure_dir(self.cache_dir)
+            cached_ptx = cache_dir / f"{key}.ptx"
+            cached_cubin = cache_dir / f"{key}.cubin"
+            hit = cached_ptx.exists() and cached_cubin.exists()
+            scratch = None if hit else tempfile.TemporaryDirectory(dir=cache_dir)
+        except OSError:
+            return self._compile_cuda_uncached(cuda_file, output_dir)
+
+        if scratch is not None:
+            # Build in a scratch dir next to the cache so the renames below are atomic
+            with scratch as tmp_dir:
+                tmp_ptx, tmp_cubin = self._compile_cuda(cuda_file, Path(tmp_dir))
+                try:
+                    os.replace(tmp_ptx, cached_ptx)
+                    os.replace(tmp_cubin, cached_cubin)
+                except OSError:
+                    # Cache not writable after all; hand over the fresh build directly
+                    # (the PTX may already have been moved into the cache)
+                    _publish(tmp_ptx if tmp_ptx.exists() else cached_ptx, ptx_file)
+                    _publish(tmp_cubin, cubin_file)
+                    return ptx_file, cubin_file
+
+        try:
+            _publish(cached_ptx, ptx_file)
+            _publish(cached_cubin, cubin_file)
+        except OSError:
+            return self._compile_cuda_uncached(cuda_file, output_dir)
+        return ptx_file, cubin_file
+
+    def _compile_cuda_uncached(self, cuda_file: Path, output_dir: Path) -> Tuple[Path, Path]:
+        """Compile into a scratch dir and rename the outputs into place"""
+        # Replacing rather than rewriting keeps hard links to earlier outputs intact
+        with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir:
+            tmp_ptx, tmp_cubin = self._compile_cuda(cuda_file, Path(tmp_dir))
+            ptx_file = output_dir / tmp_ptx.name
+            cubin_file = output_dir / tmp_cubin.name
+            os.replace(tmp_ptx, ptx_file)
+            os.replace(tmp_cubin, cubin_file)
+        return ptx_file, cubin_file
+
+    def _cache_key(self, cuda_file: Path) -> Optional[str]:
+        """Hash everything that affects the compiled output; None if that can't be determined"""
+        headers = _local_includes(cuda_file)
+        if headers is None:
+            return None
+        h = hashlib.blake2b(cuda_file.read_bytes(), digest_size=20)
+        # Included files from the source tree are part of the input too
+        for header in headers:
+            h.update(b'\0' + str(header).encode() + b'\0' + header.read_bytes())
+        for part in (self.arch, *self._nvrtc_options(), *self._nvcc_options(), _toolchain_version()):
+            h.update(b'\0' + part.encode())
+        return h.hexdigest()
+
+    def _nvrtc_options(self) -> List[str]:
+        """Code generation options passed to NVRTC"""
+        # A real sm_XX target makes NVRTC emit SASS, so no JIT is needed at load time
+        return [f'--gpu-architecture={self.arch}']
+
+    def _nvcc_options(self) -> List[str]:
+        """Code generation options passed to nvcc"""
+        return [f'-arch={self.arch}', '-O3']
+
     def _compile_cuda(self, cuda_file: Path, output_dir: Path) -> Tuple[Path, Path]:
+        """Compile CUDA source to PTX and CUBIN (NVRTC in-process, nvcc as fallback)"""
+        if nvrtc is None:
+            return self._compile_cuda_nvcc(cuda_file, output_dir)
+
+        stem = cuda_file.stem
+        ptx_file = output_dir / f"{stem}.ptx"
+        cubin_file = output_dir / f"{stem}.cubin"
+
+        try:
+            ptx, cubin = self._nvrtc_compile(cuda_file)
+        except RuntimeError as nvrtc_error:
+            # NVRTC cannot handle everything nvcc can (host headers, archs newer than
+            # the installed NVRTC), so give nvcc a chance before reporting failure
+            print(f"NVRTC failed, retrying with nvcc: {nvrtc_error}")
+            try:
+                return self._compile_cuda_nvcc(cuda_file, output_dir)
+            except (RuntimeError, FileNotFoundError) as nvcc_error:
+                raise RuntimeError(f"{nvrtc_error}\n\nnvcc fallback failed: {nvcc_error}") from nvcc_error
+        ptx_file.write_bytes(ptx)
+        cubin_file.write_bytes(cubin)
+
+        return ptx_file, cubin_file
+
+    def _nvrtc_compile(self, cuda_file: Path) -> Tuple[bytes, bytes]:
+        """Compile CUDA source with NVRTC and return (ptx, cubin) bytes from one program"""
+        err, prog = nvrtc.nvrtcCreateProgram(cuda_file.read_bytes(), cuda_file.name.encode(), 0, [], [])
+        _check_nvrtc(err)
+        try:
+            # Resolve includes like nvcc does: next to the source, then the toolkit headers
+            include_dirs = [cuda_file.parent]
+            toolkit_include = _cuda_include_dir()
+            if toolkit_include is not None:
+                include_dirs.append(toolkit_include)
+            options = [opt.encode() for opt in self._nvrtc_options()]
+            options += [f'-I{d}'.encode() for d in include_dirs]
+            err, = nvrtc.nvrtcCompileProgram(prog, len(options), options)
+            if err != nvrtc.nvrtcResult.NVRTC_SUCCESS:
+                raise RuntimeError(f"NVRTC compilation failed:\n{_nvrtc_log(prog)}")
+
+            err, cubin_size = nvrtc.nvrtcGetCUBINSize(prog)
+            _check_nvrtc(err)
+            cubin = b' ' * cubin_size
+            err, = nvrtc.nvrtcGetCUBIN(prog, cubin)
+            _check_nvrtc(err)
+
+            err, ptx_size = nvrtc.nvrtcGetPTXSize(prog)
+            _check_nvrtc(err)
+            ptx = b' ' * ptx_size
+            err, = nvrtc.nvrtcGetPTX(prog, ptx)
+            _check_nvrtc(err)
+        finally:
+            nvrtc.nvrtcDestroyProgram(prog)
+
+        # PTX is returned NUL-terminated
+        return ptx.rstrip(b'\0'), cubin
+
+    def _compile_cuda_nvcc(self, cuda_file: Path, output_dir: Path) -> Tuple[Path, Path]:
         """Compile CUDA source to PTX and CUBIN using nvcc"""
         stem = cuda_file.stem
         ptx_file = output_dir / f"{stem}.ptx"
         cubin_file = output_dir / f"{stem}.cubin"
         
-        # Compile to PTX
-        run_command([
-            'nvcc',
-            '-ptx',
-            str(cuda_file),
-            '-o', str(ptx_file),
-            #'-arch=sm_80',  # Adjust based on target architecture
-            '-arch=sm_86',
-            '-O3'
-        ])
-        
-        # Compile to CUBIN
-        run_command([
-            'nvcc',
-            '-cubin',
-            str(cuda_file),
-            '-o', str(cubin_file),
-            '-arch=sm_86',
-            '-O3'
-        ])
+        # A single nvcc run emits the CUBIN; --keep retains the PTX it was built from,
+        # so the frontend only parses the source once
+        with tempfile.TemporaryDirectory() as keep_dir:
+            run_command([
+                'nvcc',
+                '-cubin',
+                str(cuda_file),
+                '-o', str(cubin_file),
+                '--keep',
+                '--keep-dir', keep_dir,
+                *self._nvcc_options()
+            ])
+            kept_ptx = sorted(Path(keep_dir).glob(f"{stem}*.ptx"))
+            if not kept_ptx:
+                raise RuntimeError(f"nvcc did not keep a PTX file for {cuda_file}")
+            shutil.move(str(kept_ptx[0]), str(ptx_file))
         
         return ptx_file, cubin_file
 
@@ -66,4 +219,108 @@ class Compiler:
         # 2. Use triton.compile() to get PTX
         # 3. Convert PTX to CUBIN using nvcc
         # This would require more complex implementation
-        raise NotImplementedError("Triton compilation not yet implemented")
\ No newline at end of file
+        raise NotImplementedError("Triton compilation not yet implemented")
+
+
+# Trailing \r is whitespace too, so CRLF sources resolve like LF ones
+_INCLUDE_RE = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*(.*?)[ \t\r]*(?://.*|/\*.*)?$', re.MULTILINE)
+
+
+def _local_includes(cuda_file: Path) -> Optional[List[Path]]:
+    """
+    Collect the files a CUDA source includes from its own tree, recursively
+    
+    Quoted includes resolve against the including file's directory and then the
+    source directory (the -I NVRTC gets); <...> includes only against the source
+    directory, since toolkit/system headers are covered by the compiler version.
+    Returns None when an include can't be resolved statically (e.g. a macro).
+    """
+    root = cuda_file.parent
+    seen = {cuda_file.resolve()}
+    headers = []
+    pending = [cuda_file]
+    while pending:
+        current = pending.pop()
+        for target in _INCLUDE_RE.findall(current.read_bytes()):
+            if len(target) >= 2 and target[:1] == b'"' and target[-1:] == b'"':
+                search = [current.parent, root]
+            elif len(target) >= 2 and target[:1] == b'<' and target[-1:] == b'>':
+                search = [root]
+            else:
+                return None
+            name = target[1:-1].decode(errors='replace')
+            for directory in search:
+                candidate = (directory / name).resolve()
+                if candidate.is_file():
+                    if candidate not in seen:
+                        seen.add(candidate)
+                        headers.append(candidate)
+                        pending.append(candidate)
+                    break
+    return sorted(headers)
+
+
+def _detect_arch(device: int = 0) -> str:
+    """Return the sm_XX target matching the compute capability of a CUDA device"""
+    try:
+        cuda.init()
+        major, minor = cuda.Device(device).compute_capability()
+    except cuda.Error:
+        return DEFAULT_ARCH
+    return f"sm_{major}{minor}"
+
+
+@lru_cache(maxsize=1)
+def _toolchain_version() -> str:
+    """Version string of the CUDA compilers that may produce a CUBIN"""
+    versions = []
+    if nvrtc is not None:
+        err, major, minor = nvrtc.nvrtcVersion()
+        _check_nvrtc(err)
+        versions.append(f"nvrtc {major}.{minor}")
+    if _which('nvcc') is not None:
+        stdout, _ = run_command(['nvcc', '--version'])
+        versions.append(stdout.decode(errors='replace'))
+    return '\n'.join(versions)
+
+
+@lru_cache(maxsize=1)
+def _cuda_include_dir() -> Optional[Path]:
+    """Locate the CUDA toolkit include directory (CUDA_HOME/CUDA_PATH, else next to nvcc)"""
+    roots = [os.environ.get('CUDA_HOME'), os.environ.get('CUDA_PATH')]
+    nvcc = _which('nvcc')
+    if nvcc is not None:
+        roots.append(str(Path(nvcc).resolve().parent.parent))
+    for root in roots:
+        if root and (Path(root) / 'include').is_dir():
+            return Path(root) / 'include'
+    return None
+
+
+def _publish(src: Path, dst: Path) -> None:
+    """Copy src to dst via a temporary file and an atomic rename"""
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.name}.")
+    os.close(fd)
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _check_nvrtc(err) -> None:
+    """Raise if an NVRTC call did not succeed"""
+    if err != nvrtc.nvrtcResult.NVRTC_SUCCESS:
+        _, msg = nvrtc.nvrtcGetErrorString(err)
+        raise RuntimeError(f"NVRTC error: {msg.decode()}")
+
+
+def _nvrtc_log(prog) -> str:
+    """Return the compilation log of an NVRTC program"""
+    err, log_size = nvrtc.nvrtcGetProgramLogSize(prog)
+    _check_nvrtc(err)
+    log = b' ' * log_size
+    err, = nvrtc.nvrtcGetProgramLog(prog, log)
+    _check_nvrtc(err)
+    return log.rstrip(b'\0').decode(errors='replace')
\ No newline at end of file
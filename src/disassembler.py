@@ -1,6 +1,8 @@
+import os
+import shutil
 from pathlib import Path
-from typing import Union
-from .utils import run_command, ensure_dir
+from typing import Optional, Tuple, Union
+from .utils import run_command, run_command_to_file, ensure_dir
 
 class Disassembler:
     """Handles disassembly of CUBIN files to SASS"""
@@ -16,23 +18,61 @@ class Disassembler:
         Returns:
             Path to the generated CuASM file (for reassembly)
         """
-        cubin_path = Path(cubin_file)
-        output_dir = ensure_dir(output_dir)
+        _, cuasm_file = self._disassemble(Path(cubin_file), ensure_dir(output_dir), capture_sass=False)
+        return cuasm_file
+
+    def disassemble_text(
+        self, cubin_file: Union[str, Path], output_dir: Union[str, Path]
+    ) -> Tuple[bytes, bytes, Path]:
+        """
+        Disassemble like disassemble(), but also return the generated contents for display
+        
+        Args:
+            cubin_file: Path to input CUBIN file
+            output_dir: Directory to store output files
+        
+        Returns:
+            Tuple of (sass_bytes, cuasm_bytes, cuasm_file)
+        """
+        sass_bytes, cuasm_file = self._disassemble(Path(cubin_file), ensure_dir(output_dir), capture_sass=True)
+        return sass_bytes, cuasm_file.read_bytes(), cuasm_file
+
+    def _disassemble(self, cubin_path: Path, output_dir: Path, capture_sass: bool) -> Tuple[Optional[bytes], Path]:
+        """Write .sass, .original.cubin and .cuasm; return the SASS bytes if captured"""
         sass_file = output_dir / f"{cubin_path.stem}.sass"
         cuasm_file = output_dir / f"{cubin_path.stem}.cuasm"
         
         # Generate human-readable SASS (for viewing only)
-        sass_text, _ = run_command([
+        nvdisasm_cmd = [
             'nvdisasm',
             '-g',  # Show debug info
             '-c',  # Show control flow
             str(cubin_path)
-        ])
-        sass_file.write_text(sass_text)
+        ]
+        sass_bytes = None
+        if capture_sass:
+            # The caller displays it, so keep nvdisasm's stdout instead of reading the file back
+            sass_bytes, _ = run_command(nvdisasm_cmd)
+            sass_file.write_bytes(sass_bytes)
+        else:
+            # Streamed straight to disk, never held in Python memory
+            run_command_to_file(nvdisasm_cmd, sass_file)
         
-        # Save the original CUBIN alongside for comparison
-        import shutil
-        shutil.copy2(cubin_path, output_dir / f"{cubin_path.stem}.original.cubin")
+        # Save the original CUBIN alongside for comparison. CUBINs in output_dir come from
+        # the Compiler/Assembler, which replace their outputs by rename, so a hard link
+        # stays a snapshot and avoids copying the bytes. Anything else may be rewritten
+        # in place by other tools, so it is copied (as is anything that can't be linked).
+        original_file = output_dir / f"{cubin_path.stem}.original.cubin"
+        original_file.unlink(missing_ok=True)
+        linked = False
+        if cubin_path.resolve().parent == output_dir.resolve():
+            try:
+                os.link(cubin_path, original_file)
+                linked = True
+            except OSError:
+                pass
+        if not linked:
+            shutil.copy2(cubin_path, original_file)
         
         # Generate CuASM format (this is what we'll actually modify and reassemble)
         run_command([
@@ -42,7 +82,7 @@ class Disassembler:
             '-o', str(cuasm_file)
         ])
         
-        return cuasm_file
+        return sass_bytes, cuasm_file
 
     def _parse_sass(self, sass_text: str) -> dict:
         """Parse SASS assembly into a structured format for easier manipulation"""
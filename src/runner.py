@@ -2,22 +2,53 @@ import numpy as np
 import pycuda.driver as cuda
 from pathlib import Path
 from typing import Union, Dict, Any, Optional, Tuple
-import time
-import json
+import orjson
 import threading
 import atexit
+from functools import lru_cache
+from elftools.elf.elffile import ELFFile
+from elftools.elf.sections import SymbolTableSection
 
 
 def parse_kernel_args(args_str: str) -> Dict[str, Any]:
-    import json
-    return json.loads(args_str)
+    return orjson.loads(args_str)
+
+
+@lru_cache(maxsize=8)
+def _load_cubin_cached(path_str: str, mtime_ns: int, size: int, context_id: int) -> cuda.Module:
+    """Load a CUBIN into the current context, memoized per (file identity, context)"""
+    with open(path_str, "rb") as f:
+        cubin = f.read()
+    return cuda.module_from_buffer(cubin)
+
+
+@lru_cache(maxsize=8)
+def _kernel_names_cached(path_str: str, mtime_ns: int, size: int) -> Tuple[str, ...]:
+    """List kernel entry points of a CUBIN, memoized per file identity"""
+    with open(path_str, "rb") as f:
+        elf = ELFFile(f)
+        # Every kernel entry gets its own .nv.info.<name> attribute section
+        info_prefix = ".nv.info."
+        info_names = {
+            sec.name[len(info_prefix):]
+            for sec in elf.iter_sections()
+            if sec.name.startswith(info_prefix)
+        }
+        symtab = elf.get_section_by_name(".symtab")
+        if not isinstance(symtab, SymbolTableSection):
+            return ()
+        return tuple(
+            sym.name for sym in symtab.iter_symbols()
+            if sym["st_info"]["type"] == "STT_FUNC" and sym.name in info_names
+        )
 
 
 class KernelRunner:
     """Handles execution and benchmarking of CUDA kernels from CUBIN files"""
     
     _thread_local = threading.local()
-    _contexts_to_cleanup = []
+    _primary_context = None
+    _primary_context_lock = threading.Lock()
     _cleanup_registered = False
     
     def __init__(self):
@@ -28,67 +59,94 @@ class KernelRunner:
     
     @classmethod
     def _cleanup_all_contexts(cls):
-        """Clean up all CUDA contexts at exit"""
-        for ctx in cls._contexts_to_cleanup:
-            try:
-                ctx.pop()
-            except:
-                pass
-        cls._contexts_to_cleanup.clear()
+        """Release the CUDA primary context at exit"""
+        # Cached modules belong to the context being released
+        _load_cubin_cached.cache_clear()
+        if cls._primary_context is None:
+            return
+        try:
+            cls._primary_context.pop()
+        except cuda.Error:
+            pass  # Only current on the threads that ran kernels, not necessarily this one
+        cls._primary_context.detach()
+        cls._primary_context = None
     
     def _ensure_cuda_context(self):
-        """Initialize CUDA context if not already done in this thread"""
-        if not hasattr(self._thread_local, 'context'):
-            cuda.init()
-            device = cuda.Device(0)
-            ctx = device.make_context()
-            self._thread_local.context = ctx
-            self._contexts_to_cleanup.append(ctx)
-        else:
-            # Push context if it's not current
-            try:
-                self._thread_local.context.push()
-            except cuda.LogicError:
-                pass  # Context already current
+        """Make the device's primary context current in this thread (once per thread)"""
+        if getattr(self._thread_local, 'context', None) is not None:
+            return
+        # The primary context is retained once per process and shared by all threads
+        # (and by other CUDA libraries), so it stays current without per-run push/pop
+        with KernelRunner._primary_context_lock:
+            if KernelRunner._primary_context is None:
+                cuda.init()
+                KernelRunner._primary_context = cuda.Device(0).retain_primary_context()
+        KernelRunner._primary_context.push()
+        self._thread_local.context = KernelRunner._primary_context
 
     def run(
         self,
         cubin_file: Union[str, Path],
         args_str: Optional[str] = None,
         compare_with: Optional[Union[str, Path]] = None,
+        check: bool = True,
     ) -> Dict[str, Any]:
-        """Load and run a kernel from a CUBIN file"""
+        """Load and run a kernel from a CUBIN file
+
+        With check=False only timings are collected; the output is not copied
+        back or verified against the host reference.
+        """
         # Ensure CUDA context exists in this thread
         self._ensure_cuda_context()
         
         cubin_path = Path(cubin_file)
         args = parse_kernel_args(args_str or '{"n": 1024}')
+        kernel_name, kernel = self._load_kernel(cubin_path, args.get("kernel"))
 
-        print("Loading CUBIN:", cubin_path)
-        module = self._load_cubin(cubin_path)
+        n = args.get("n", 1024)
+        stream = cuda.Stream()
+        bufs = self._setup_inputs(n, stream, args.get("seed", 0))
 
-        kernel_name = self._get_first_kernel_name(module)
-        print("Kernel name:", kernel_name)
+        results = self._new_results(cubin_path, kernel_name)
 
-        kernel = module.get_function(kernel_name)
+        try:
+            results.update(self._bench(kernel, bufs, n, stream, check))
 
-        # Prepare test data
-        n = args.get("n", 1024)
-        block_size = 256
-        grid_size = (n + block_size - 1) // block_size
+            if compare_with:
+                # Benchmark the reference kernel on the very same device buffers and inputs
+                compare_path = Path(compare_with)
+                compare_name, compare_kernel = self._load_kernel(compare_path, args.get("kernel"))
+                compare_results = self._new_results(compare_path, compare_name)
+                compare_results.update(self._bench(compare_kernel, bufs, n, stream, check))
+                results['comparison'] = self._compare_results(results, compare_results)
 
-        a = np.random.rand(n).astype(np.float32)
-        b = np.random.rand(n).astype(np.float32)
-        c = np.zeros_like(a)
+        except Exception as e:
+            results.update({"success": False, "error": str(e)})
+        finally:
+            a_gpu, b_gpu, c_gpu, _, _ = bufs
+            a_gpu.free()
+            b_gpu.free()
+            c_gpu.free()
 
-        a_gpu = cuda.mem_alloc(a.nbytes)
-        b_gpu = cuda.mem_alloc(b.nbytes)
-        c_gpu = cuda.mem_alloc(c.nbytes)
+        return results
 
-        cuda.memcpy_htod(a_gpu, a)
-        cuda.memcpy_htod(b_gpu, b)
+    # ---- Helpers ----
 
-        results = {
+    def _load_kernel(
+        self, cubin_path: Path, kernel_name: Optional[str] = None
+    ) -> Tuple[str, cuda.Function]:
+        """Load a CUBIN and return its kernel name (first entry unless given) and function"""
+        print("Loading CUBIN:", cubin_path)
+        module = self._load_cubin(cubin_path)
+
+        kernel_name = kernel_name or self._get_first_kernel_name(cubin_path)
+        print("Kernel name:", kernel_name)
+
+        return kernel_name, module.get_function(kernel_name)
+
+    def _new_results(self, cubin_path: Path, kernel_name: str) -> Dict[str, Any]:
+        """Return an empty results record for a kernel"""
+        return {
             "kernel": cubin_path.name,
             "kernel_name": kernel_name,
             "success": False,
@@ -97,88 +155,141 @@ class KernelRunner:
             "correctness": {},
         }
 
-        try:
-            # Warmup
+    def _setup_inputs(
+        self, n: int, stream: cuda.Stream, seed: int = 0
+    ) -> Tuple[Any, Any, Any, np.ndarray, np.ndarray]:
+        """Allocate device buffers and upload random inputs, returning (a_gpu, b_gpu, c_gpu, a, b)"""
+        # A fresh generator per run, so every run with the same seed sees the same inputs
+        rng = np.random.default_rng(seed)
+        # Page-locked host buffers let the driver DMA directly, without a staging copy
+        a = cuda.pagelocked_empty(n, np.float32)
+        b = cuda.pagelocked_empty(n, np.float32)
+        # Generate float32 directly into the pinned buffers (no float64 temporary)
+        rng.random(dtype=np.float32, out=a)
+        rng.random(dtype=np.float32, out=b)
+
+        a_gpu = cuda.mem_alloc(a.nbytes)
+        b_gpu = cuda.mem_alloc(b.nbytes)
+        c_gpu = cuda.mem_alloc(a.nbytes)
+
+        cuda.memcpy_htod_async(a_gpu, a, stream)
+        cuda.memcpy_htod_async(b_gpu, b, stream)
+
+        return a_gpu, b_gpu, c_gpu, a, b
+
+    def _check_buffers(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return float32 (expected, error) scratch views of length n, grown as needed"""
+        # Per thread, since the UI may run kernels from several worker threads
+        scratch = getattr(self._thread_local, 'check_scratch', None)
+        if scratch is None or scratch.shape[1] < n:
+            scratch = np.empty((2, n), dtype=np.float32)
+            self._thread_local.check_scratch = scratch
+        return scratch[0, :n], scratch[1, :n]
+
+    def _bench(
+        self,
+        kernel: cuda.Function,
+        bufs: Tuple[Any, Any, Any, np.ndarray, np.ndarray],
+        n: int,
+        stream: cuda.Stream,
+        check: bool,
+    ) -> Dict[str, Any]:
+        """Benchmark a kernel on prepared buffers and optionally verify its output"""
+        a_gpu, b_gpu, c_gpu, a, b = bufs
+        block_size = 256
+        grid_size = (n + block_size - 1) // block_size
+
+        # Warmup (queued behind the uploads on the same stream)
+        kernel(a_gpu, b_gpu, c_gpu, np.int32(n),
+               block=(block_size, 1, 1), grid=(grid_size, 1), stream=stream)
+        stream.synchronize()
+
+        # Benchmark: time each launch on the device with events, sync once at the end
+        iterations = 100
+        start_events = [cuda.Event() for _ in range(iterations)]
+        stop_events = [cuda.Event() for _ in range(iterations)]
+        for start, stop in zip(start_events, stop_events):
+            start.record(stream)
             kernel(a_gpu, b_gpu, c_gpu, np.int32(n),
-                   block=(block_size, 1, 1), grid=(grid_size, 1))
-            cuda.Context.synchronize()
-
-            # Benchmark
-            times = []
-            for _ in range(100):
-                start = time.perf_counter()
-                kernel(a_gpu, b_gpu, c_gpu, np.int32(n),
-                       block=(block_size, 1, 1), grid=(grid_size, 1))
-                cuda.Context.synchronize()
-                times.append(time.perf_counter() - start)
-
-            # Retrieve results
-            cuda.memcpy_dtoh(c, c_gpu)
-            expected = a + b
-            max_error = np.max(np.abs(c - expected))
-
-            # Prepare human-inspectable samples (first 10 entries)
+                   block=(block_size, 1, 1), grid=(grid_size, 1), stream=stream)
+            stop.record(stream)
+
+        # Retrieve results (the output is only needed for the correctness check)
+        if check:
+            c = cuda.pagelocked_empty(n, np.float32)
+            cuda.memcpy_dtoh_async(c, c_gpu, stream)
+        stream.synchronize()
+        times = [start.time_till(stop) / 1000.0
+                 for start, stop in zip(start_events, stop_events)]
+
+        # Results hold plain Python scalars so any consumer (rich, json) can use them
+        results = {
+            'success': True,
+            'timing': {
+                'mean_ms': float(np.mean(times) * 1000),
+                'std_ms': float(np.std(times) * 1000),
+                'min_ms': float(np.min(times) * 1000),
+                'max_ms': float(np.max(times) * 1000),
+            },
+            'test_size': n,
+        }
+
+        if check:
+            # Reference and error are computed in preallocated scratch buffers
+            expected, error = self._check_buffers(n)
+            np.add(a, b, out=expected)
+            np.subtract(c, expected, out=error)
+            np.abs(error, out=error)
+            max_error = error.max()
+
+            # Prepare human-inspectable samples (first 10 entries); tolist() converts
+            # each slice to Python floats in one C call
             sample_count = min(5, int(n))
-            samples = []
-            for i in range(sample_count):
-                samples.append({
-                    'idx': int(i),
-                    'a': float(a[i]),
-                    'b': float(b[i]),
-                    'out': float(c[i]),
-                    'expected': float(expected[i]),
-                    'error': float(abs(c[i] - expected[i])),
-                })
+            samples = [
+                {'idx': i, 'a': a_i, 'b': b_i, 'out': c_i, 'expected': e_i, 'error': err_i}
+                for i, (a_i, b_i, c_i, e_i, err_i) in enumerate(zip(
+                    a[:sample_count].tolist(),
+                    b[:sample_count].tolist(),
+                    c[:sample_count].tolist(),
+                    expected[:sample_count].tolist(),
+                    error[:sample_count].tolist(),
+                ))
+            ]
 
             results.update({
-                'success': True,
-                'timing': {
-                    'mean_ms': np.mean(times) * 1000,
-                    'std_ms': np.std(times) * 1000,
-                    'min_ms': np.min(times) * 1000,
-                    'max_ms': np.max(times) * 1000,
-                },
                 'correctness': {
                     'max_error': float(max_error),
-                    'passed': float(max_error) < 1e-6,
+                    'passed': bool(max_error < 1e-6),
                 },
                 'samples': samples,
-                'test_size': n,
             })
 
-            if compare_with:
-                compare_results = self.run(compare_with, args_str)
-                results['comparison'] = self._compare_results(results, compare_results)
-
-        except Exception as e:
-            results.update({"success": False, "error": str(e)})
-        finally:
-            a_gpu.free()
-            b_gpu.free()
-            c_gpu.free()
-
         return results
 
-    # ---- Helpers ----
-
     def _load_cubin(self, cubin_path: Path):
         """Load a CUBIN file and return the CUDA module"""
         print("Loading CUBIN file...")
 
-        with open(cubin_path, "rb") as f:
-            cubin = f.read()
-
+        # Keyed on the file's identity so an edited/reassembled CUBIN is reloaded
+        st = cubin_path.stat()
         try:
-            module = cuda.module_from_buffer(cubin)
+            module = _load_cubin_cached(
+                str(cubin_path.resolve()), st.st_mtime_ns, st.st_size,
+                id(self._thread_local.context),
+            )
             print("CUBIN loaded successfully!")
             return module
         except Exception as e:
             print("CUBIN load failed:", e)
             raise
 
-    def _get_first_kernel_name(self, module: cuda.Module) -> str:
-        """Return known kernel name (for now static)"""
-        return "vector_add"
+    def _get_first_kernel_name(self, cubin_path: Path) -> str:
+        """Return the first kernel entry point found in the CUBIN's symbol table"""
+        st = cubin_path.stat()
+        names = _kernel_names_cached(str(cubin_path.resolve()), st.st_mtime_ns, st.st_size)
+        if not names:
+            raise RuntimeError(f"No kernel entry points found in {cubin_path}")
+        return names[0]
 
     def _compare_results(
         self, new_results: Dict[str, Any], old_results: Dict[str, Any]
@@ -188,12 +299,13 @@ class KernelRunner:
 
         speedup = old_results["timing"]["mean_ms"] / new_results["timing"]["mean_ms"]
         return {
-            "speedup": float(speedup),
-            "speedup_percent": float((speedup - 1) * 100),
-            "original_ms": float(old_results["timing"]["mean_ms"]),
-            "modified_ms": float(new_results["timing"]["mean_ms"]),
+            "speedup": speedup,
+            "speedup_percent": (speedup - 1) * 100,
+            "original_ms": old_results["timing"]["mean_ms"],
+            "modified_ms": new_results["timing"]["mean_ms"],
+            # None when correctness was not checked
             "both_correct": (
-                new_results["correctness"]["passed"]
-                and old_results["correctness"]["passed"]
+                new_results["correctness"].get("passed")
+                and old_results["correctness"].get("passed")
             ),
         }
\ No newline at end of file
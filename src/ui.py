@@ -1,8 +1,8 @@
-import json
 from pathlib import Path
 from typing import Tuple
 
 import gradio as gr
+import orjson
 
 from .compiler import Compiler
 from .disassembler import Disassembler
@@ -20,12 +20,12 @@ runner = KernelRunner()
 
 # Helpers
 def _read_text(path: Path) -> str:
-    return path.read_text() if path.exists() else ''
+    return path.read_bytes().decode('utf-8', 'replace') if path.exists() else ''
 
 def compile_file(file_obj) -> Tuple[str, str, str, str]:
-    """Compile uploaded .cu or .py file and return PTX text and cubin path"""
+    """Compile uploaded .cu or .py file and return PTX text, cubin path and source text"""
     if file_obj is None:
-        return "", "", "No file provided"
+        return "", "", "", "No file provided"
     try:
         # Normalize different possible upload types from Gradio:
         # - a path string (e.g. "/tmp/.../upload")
@@ -66,7 +66,7 @@ def compile_file(file_obj) -> Tuple[str, str, str, str]:
         ptx_text = _read_text(ptx_path)
         # Read source text for display
         source_text = _read_text(src_path)
-        return ptx_text, str(cubin_path), str(src_path), "Compiled successfully"
+        return ptx_text, str(cubin_path), source_text, "Compiled successfully"
     except Exception as e:
         return "", "", "", f"Compilation error: {e}"
 
@@ -75,15 +75,11 @@ def disasm_cubin(cubin_path_str: str) -> Tuple[str, str, str, str]:
     """Disassemble CUBIN into readable SASS and CuASM format"""
     try:
         cubin_path = Path(cubin_path_str)
-        # Now disassemble returns the cuasm_path directly
-        cuasm_path = disassembler.disassemble(cubin_path, BUILD_DIR)
+        # Contents come back with the paths, so nothing is re-read from disk
+        sass_bytes, cuasm_bytes, cuasm_path = disassembler.disassemble_text(cubin_path, BUILD_DIR)
         
-        # Get human-readable SASS for display only
-        sass_path = cuasm_path.parent / f"{cuasm_path.stem}.sass"
-        
-        # Read both files
-        sass_text = _read_text(sass_path)  # For display only
-        cuasm_text = _read_text(cuasm_path)  # The actual file we'll edit
+        sass_text = sass_bytes.decode('utf-8', 'replace')  # For display only
+        cuasm_text = cuasm_bytes.decode('utf-8', 'replace')  # The actual file we'll edit
         
         return sass_text, cuasm_text, str(cuasm_path), "Disassembled successfully"
     except Exception as e:
@@ -112,7 +108,8 @@ def run_and_compare(original_cubin_path: str, new_cubin_path: str, args_str: str
         #res = runner.run(new_cubin_path, args, compare_with=original_cubin_path)
         res = runner.run(new_cubin_path, args, compare_with=None)
 
-        return json.dumps(res, indent=2), "Run completed"
+        out = orjson.dumps(res, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        return out.decode(), "Run completed"
     except Exception as e:
         return "", f"Run error: {e}"
 
@@ -143,14 +140,7 @@ with gr.Blocks(title='SASS Playground') as demo:
 
     # Wire callbacks
     def _compile_click(file_obj):
-        ptx, cubin_path, src_path, msg = compile_file(file_obj)
-        # try to read source text
-        src_text = ''
-        try:
-            if src_path:
-                src_text = Path(src_path).read_text()
-        except Exception:
-            src_text = ''
+        ptx, cubin_path, src_text, msg = compile_file(file_obj)
         return ptx, cubin_path, src_text
 
     def _disasm_click(cubin_path):
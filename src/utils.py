@@ -1,8 +1,11 @@
 import os
 import json
+import shutil
 import subprocess
+import uuid
+from functools import lru_cache
 from pathlib import Path
-from typing import Union, List, Dict, Any, Tuple
+from typing import Union, List, Dict, Any, Optional, Tuple
 
 def ensure_dir(path: Union[str, Path]) -> Path:
     """Ensure a directory exists, create if it doesn't"""
@@ -10,20 +13,54 @@ def ensure_dir(path: Union[str, Path]) -> Path:
     path.mkdir(parents=True, exist_ok=True)
     return path
 
-def run_command(cmd: List[str], cwd: Union[str, Path] = None) -> Tuple[str, str]:
-    """Run a shell command and return stdout and stderr"""
+@lru_cache(maxsize=None)
+def _which(name: str) -> Optional[str]:
+    """Resolve an executable on PATH once per process"""
+    return shutil.which(name)
+
+def _resolve(cmd: List[str]) -> List[str]:
+    """Replace the program name with its absolute path when it can be found"""
+    exe = _which(cmd[0])
+    return [exe, *cmd[1:]] if exe else cmd
+
+def run_command(cmd: List[str], cwd: Union[str, Path] = None) -> Tuple[bytes, bytes]:
+    """Run a shell command and return raw stdout and stderr bytes"""
+    result = subprocess.run(
+        _resolve(cmd),
+        cwd=cwd,
+        capture_output=True,
+        check=False
+    )
+    if result.returncode != 0:
+        stderr = result.stderr.decode(errors='replace')
+        raise RuntimeError(f"Command failed with exit code {result.returncode}:\n{stderr}")
+    return result.stdout, result.stderr
+
+def run_command_to_file(cmd: List[str], out_path: Union[str, Path], cwd: Union[str, Path] = None) -> bytes:
+    """Run a shell command with stdout redirected into out_path and return stderr"""
+    out_path = Path(out_path)
+    # Stream into a sibling temp file so a failed command never leaves a partial out_path.
+    # open(..., 'xb') rather than mkstemp, so the file gets umask permissions like a plain write
+    tmp_path = out_path.with_name(f".{out_path.name}.{uuid.uuid4().hex}.tmp")
     try:
-        result = subprocess.run(
-            cmd,
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout, result.stderr
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Command failed with exit code {e.returncode}:\n{e.stderr}")
+        with open(tmp_path, 'xb') as out:
+            result = subprocess.run(
+                _resolve(cmd),
+                cwd=cwd,
+                stdout=out,
+                stderr=subprocess.PIPE,
+                check=False
+            )
+        if result.returncode != 0:
+            stderr = result.stderr.decode(errors='replace')
+            raise RuntimeError(f"Command failed with exit code {result.returncode}:\n{stderr}")
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return result.stderr
 
+@lru_cache(maxsize=1)
 def check_cuda_installation() -> bool:
     """Check if CUDA toolkit is installed and accessible"""
     try: